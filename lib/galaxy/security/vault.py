@@ -2,16 +2,15 @@ import abc
 import logging
 import os
 import re
+from functools import lru_cache
 from typing import (
     List,
     Optional,
+    Set,
+    TYPE_CHECKING,
 )
 
 import yaml
-from cryptography.fernet import (
-    Fernet,
-    MultiFernet,
-)
 from sqlalchemy import select
 
 try:
@@ -32,10 +31,14 @@ except ImportError:
 
 from galaxy import model
 from galaxy.model.base import transaction
+from galaxy.util.yaml_util import SafeLoader
+
+if TYPE_CHECKING:
+    from cryptography.fernet import MultiFernet
 
 log = logging.getLogger(__name__)
 
-VAULT_KEY_INVALID_REGEX = re.compile(r"\s\/|\/\s|\/\/")
+VAULT_KEY_WHITESPACE_SEPARATOR_REGEX = re.compile(r"\s\/|\/\s")
 
 
 class InvalidVaultConfigException(Exception):
@@ -46,11 +49,30 @@ class InvalidVaultKeyException(Exception):
     pass
 
 
+def _validate_vault_key(key: str) -> bool:
+    if not key or "//" in key:
+        return False
+    return not VAULT_KEY_WHITESPACE_SEPARATOR_REGEX.search(key)
+
+
+def _normalize_vault_key(key: str) -> str:
+    # remove leading and trailing slashes
+    key = key.strip("/")
+    if not _validate_vault_key(key):
+        raise InvalidVaultKeyException(
+            f"Vault key: {key} is invalid. Make sure that it is not empty, contains double slashes or contains"
+            "whitespace before or after the separator."
+        )
+    return key
+
+
 class Vault(abc.ABC):
     """
     A simple abstraction for reading/writing from external vaults.
     """
 
+    __slots__ = ()
+
     @abc.abstractmethod
     def read_secret(self, key: str) -> Optional[str]:
         """
@@ -83,6 +105,8 @@ class Vault(abc.ABC):
 
 
 class NullVault(Vault):
+    __slots__ = ()
+
     def read_secret(self, key: str) -> Optional[str]:
         raise InvalidVaultConfigException(
             "No vault configured. Make sure the vault_config_file setting is defined in galaxy.yml"
@@ -97,7 +121,13 @@ class NullVault(Vault):
         raise NotImplementedError()
 
 
+# NullVault is stateless, so a single shared instance is returned for unconfigured vaults
+_NULL_VAULT = NullVault()
+
+
 class HashicorpVault(Vault):
+    __slots__ = ("vault_address", "vault_token", "client")
+
     def __init__(self, config):
         if not hvac:
             raise InvalidVaultConfigException(
@@ -122,54 +152,91 @@ class HashicorpVault(Vault):
 
 
 class DatabaseVault(Vault):
+    __slots__ = ("sa_session", "encryption_keys", "fernet_keys", "_multi_fernet", "_known_keys", "_decrypt_cache")
+
     def __init__(self, sa_session, config):
+        # imported here so that processes without a database vault don't load the OpenSSL bindings
+        from cryptography.fernet import (
+            Fernet,
+            MultiFernet,
+        )
+
         self.sa_session = sa_session
         self.encryption_keys = config.get("encryption_keys")
         self.fernet_keys = [Fernet(key.encode("utf-8")) for key in self.encryption_keys]
+        self._multi_fernet = MultiFernet(self.fernet_keys)
+        # parent keys known to exist in the database, used to skip parent key lookups
+        self._known_keys: Set[str] = set()
+        # keyed by ciphertext: overwriting a secret produces a new token, so cached entries never go stale
+        self._decrypt_cache = lru_cache(maxsize=512)(self._decrypt_token)
 
-    def _get_multi_fernet(self) -> MultiFernet:
-        return MultiFernet(self.fernet_keys)
+    def _get_multi_fernet(self) -> "MultiFernet":
+        return self._multi_fernet
+
+    def _decrypt_token(self, token: str) -> str:
+        return self._multi_fernet.decrypt(token.encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def _parent_keys(key: str) -> List[str]:
+        parent_keys = []
+        parent_key, _, _ = key.rpartition("/")
+        while parent_key:
+            parent_keys.append(parent_key)
+            parent_key, _, _ = parent_key.rpartition("/")
+        return parent_keys
+
+    def _load_known_parent_keys(self, key: str) -> None:
+        # fetch all existing parent keys in a single query instead of one per level
+        parent_keys = [parent_key for parent_key in self._parent_keys(key) if parent_key not in self._known_keys]
+        if parent_keys:
+            stmt = select(model.Vault.key).where(model.Vault.key.in_(parent_keys))
+            self._known_keys.update(self.sa_session.scalars(stmt))
 
     def _update_or_create(self, key: str, value: Optional[str]) -> model.Vault:
+        # Only adds entries to the session, callers are responsible for committing
         vault_entry = self._get_vault_value(key)
         if vault_entry:
             if value:
                 vault_entry.value = value
                 self.sa_session.merge(vault_entry)
-                with transaction(self.sa_session):
-                    self.sa_session.commit()
-        else:
-            # recursively create parent keys
-            parent_key, _, _ = key.rpartition("/")
-            if parent_key:
-                self._update_or_create(parent_key, None)
-            vault_entry = model.Vault(key=key, value=value, parent_key=parent_key or None)
-            self.sa_session.merge(vault_entry)
-            with transaction(self.sa_session):
-                self.sa_session.commit()
+            return vault_entry
+        # create missing parent keys, starting from the root. These rows are known not to exist,
+        # so add them directly rather than merge, which would look each one up again.
+        self._load_known_parent_keys(key)
+        for parent_key in reversed(self._parent_keys(key)):
+            if parent_key not in self._known_keys:
+                grandparent_key, _, _ = parent_key.rpartition("/")
+                self.sa_session.add(model.Vault(key=parent_key, value=None, parent_key=grandparent_key or None))
+        parent_key, _, _ = key.rpartition("/")
+        vault_entry = model.Vault(key=key, value=value, parent_key=parent_key or None)
+        self.sa_session.add(vault_entry)
         return vault_entry
 
     def read_secret(self, key: str) -> Optional[str]:
         key_obj = self._get_vault_value(key)
         if key_obj and key_obj.value:
-            f = self._get_multi_fernet()
-            return f.decrypt(key_obj.value.encode("utf-8")).decode("utf-8")
+            return self._decrypt_cache(key_obj.value)
         return None
 
     def write_secret(self, key: str, value: str) -> None:
         f = self._get_multi_fernet()
         token = f.encrypt(value.encode("utf-8"))
         self._update_or_create(key=key, value=token.decode("utf-8"))
+        with transaction(self.sa_session):
+            self.sa_session.commit()
+        self._known_keys.update(self._parent_keys(key))
 
     def list_secrets(self, key: str) -> List[str]:
         raise NotImplementedError()
 
     def _get_vault_value(self, key):
-        stmt = select(model.Vault).filter_by(key=key).limit(1)
-        return self.sa_session.scalars(stmt).first()
+        # key is the primary key, so this can be served from the identity map
+        return self.sa_session.get(model.Vault, key)
 
 
 class CustosVault(Vault):
+    __slots__ = ("client",)
+
     def __init__(self, config):
         if not custos_sdk_available:
             raise InvalidVaultConfigException(
@@ -198,6 +265,8 @@ class CustosVault(Vault):
 
 
 class UserVaultWrapper(Vault):
+    __slots__ = ("vault", "user")
+
     def __init__(self, vault: Vault, user):
         self.vault = vault
         self.user = user
@@ -220,31 +289,24 @@ class VaultKeyValidationWrapper(Vault):
     A decorator to standardize and validate vault key paths
     """
 
+    __slots__ = ("vault",)
+
     def __init__(self, vault: Vault):
         self.vault = vault
 
     @staticmethod
     def validate_key(key):
-        if not key:
-            return False
-        return not VAULT_KEY_INVALID_REGEX.search(key)
+        return _validate_vault_key(key)
 
     def normalize_key(self, key):
-        # remove leading and trailing slashes
-        key = key.strip("/")
-        if not self.validate_key(key):
-            raise InvalidVaultKeyException(
-                f"Vault key: {key} is invalid. Make sure that it is not empty, contains double slashes or contains"
-                "whitespace before or after the separator."
-            )
-        return key
+        return _normalize_vault_key(key)
 
     def read_secret(self, key: str) -> Optional[str]:
-        key = self.normalize_key(key)
+        key = _normalize_vault_key(key)
         return self.vault.read_secret(key)
 
     def write_secret(self, key: str, value: str) -> None:
-        key = self.normalize_key(key)
+        key = _normalize_vault_key(key)
         return self.vault.write_secret(key, value)
 
     def list_secrets(self, key: str) -> List[str]:
@@ -256,15 +318,18 @@ class VaultKeyPrefixWrapper(Vault):
     Adds a prefix to all vault keys, such as the galaxy instance id
     """
 
+    __slots__ = ("vault", "prefix", "_prefix_slash")
+
     def __init__(self, vault: Vault, prefix: str):
         self.vault = vault
         self.prefix = prefix.strip("/")
+        self._prefix_slash = f"/{self.prefix}/"
 
     def read_secret(self, key: str) -> Optional[str]:
-        return self.vault.read_secret(f"/{self.prefix}/{key}")
+        return self.vault.read_secret(self._prefix_slash + key)
 
     def write_secret(self, key: str, value: str) -> None:
-        return self.vault.write_secret(f"/{self.prefix}/{key}", value)
+        return self.vault.write_secret(self._prefix_slash + key, value)
 
     def list_secrets(self, key: str) -> List[str]:
         raise NotImplementedError()
@@ -275,7 +340,7 @@ class VaultFactory:
     def load_vault_config(vault_conf_yml: str) -> Optional[dict]:
         if os.path.exists(vault_conf_yml):
             with open(vault_conf_yml) as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=SafeLoader)
         return None
 
     @staticmethod
@@ -298,4 +363,4 @@ class VaultFactory:
         if vault_config:
             return VaultFactory.from_vault_type(app, vault_config.get("type", None), vault_config)
         log.warning("No vault configured. We recommend defining the vault_config_file setting in galaxy.yml")
-        return NullVault()
+        return _NULL_VAULT
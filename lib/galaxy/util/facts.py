@@ -2,6 +2,20 @@
 """
 import socket
 from collections.abc import MutableMapping
+from functools import (
+    lru_cache,
+    partial,
+)
+
+
+@lru_cache(maxsize=1)
+def _fqdn():
+    return socket.getfqdn()
+
+
+@lru_cache(maxsize=1)
+def _hostname():
+    return socket.gethostname().split(".", 1)[0]
 
 
 class Facts(MutableMapping):
@@ -21,8 +35,8 @@ class Facts(MutableMapping):
             "server_id": None,
             "instance_id": None,
             "pool_name": None,
-            "fqdn": lambda: socket.getfqdn(),
-            "hostname": lambda: socket.gethostname().split(".", 1)[0],
+            "fqdn": _fqdn,
+            "hostname": _hostname,
         }
         self.__dict__.update(defaults)
 
@@ -30,7 +44,7 @@ class Facts(MutableMapping):
         if config is not None:
             for name in dir(config):
                 if not name.startswith("_") and isinstance(getattr(config, name), str):
-                    self.__dict__[f"config_{name}"] = lambda name=name: getattr(config, name)
+                    self.__dict__[f"config_{name}"] = partial(getattr, config, name)
 
     def __getitem__(self, key):
         item = self.__dict__.__getitem__(key)
@@ -1,10 +1,16 @@
 import os
 import string
 import tempfile
+from unittest import mock
 
 import pytest
-from cryptography.fernet import InvalidToken
+from cryptography.fernet import (
+    InvalidToken,
+    MultiFernet,
+)
+from sqlalchemy import event
 
+from galaxy import model
 from galaxy.model.unittest_utils.data_app import (
     GalaxyDataTestApp,
     GalaxyDataTestConfig,
@@ -13,6 +19,7 @@ from galaxy.security.vault import (
     InvalidVaultKeyException,
     Vault,
     VaultFactory,
+    VaultKeyValidationWrapper,
 )
 from galaxy.util.unittest import TestCase
 
@@ -51,6 +58,15 @@ class AbstractTestCases:
             assert self.vault.read_secret("my/new/secret with space") == "hello overwritten"  # type: ignore
 
 
+def test_validate_key():
+    assert VaultKeyValidationWrapper.validate_key("my/new/secret")
+    assert VaultKeyValidationWrapper.validate_key("my/new/secret with space")
+    assert not VaultKeyValidationWrapper.validate_key("")
+    assert not VaultKeyValidationWrapper.validate_key("my//new/secret")
+    assert not VaultKeyValidationWrapper.validate_key("my /new/secret")
+    assert not VaultKeyValidationWrapper.validate_key("my/\tnew/secret")
+
+
 VAULT_CONF_HASHICORP = os.path.join(os.path.dirname(__file__), "fixtures/vault_conf_hashicorp.yml")
 
 
@@ -84,8 +100,80 @@ VAULT_CONF_DATABASE_INVALID = os.path.join(os.path.dirname(__file__), "fixtures/
 class TestDatabaseVault(AbstractTestCases.VaultTestBase):
     def setUp(self) -> None:
         config = GalaxyDataTestConfig(vault_config_file=VAULT_CONF_DATABASE)
-        app = GalaxyDataTestApp(config=config)
-        self.vault = VaultFactory.from_app(app)
+        self.app = GalaxyDataTestApp(config=config)
+        self.vault = VaultFactory.from_app(self.app)
+
+    def test_parent_keys_created(self):
+        self.vault.write_secret("my/parent/secret", "hello parent")
+        self.vault.write_secret("my/parent/sibling", "hello sibling")
+        assert self.vault.read_secret("my/parent/secret") == "hello parent"
+        assert self.vault.read_secret("my/parent/sibling") == "hello sibling"
+        sa_session = self.app.model.context
+        sibling = sa_session.get(model.Vault, "/my_galaxy_instance/my/parent/sibling")
+        assert sibling
+        assert sibling.parent_key == "/my_galaxy_instance/my/parent"
+        parent = sa_session.get(model.Vault, "/my_galaxy_instance/my/parent")
+        assert parent
+        assert parent.value is None
+        assert parent.parent_key == "/my_galaxy_instance/my"
+        root = sa_session.get(model.Vault, "/my_galaxy_instance")
+        assert root
+        assert root.parent_key is None
+
+    def test_existing_parent_keys_loaded(self):
+        self.vault.write_secret("my/parent/secret", "hello parent")
+        # a fresh vault doesn't know about the parent keys created above
+        vault = VaultFactory.from_app(self.app)
+        vault.write_secret("my/parent/child/secret", "hello child")
+        assert vault.read_secret("my/parent/child/secret") == "hello child"
+        sa_session = self.app.model.context
+        secret = sa_session.get(model.Vault, "/my_galaxy_instance/my/parent/child/secret")
+        assert secret
+        assert secret.parent_key == "/my_galaxy_instance/my/parent/child"
+        child = sa_session.get(model.Vault, "/my_galaxy_instance/my/parent/child")
+        assert child
+        assert child.value is None
+        assert child.parent_key == "/my_galaxy_instance/my/parent"
+        parent = sa_session.get(model.Vault, "/my_galaxy_instance/my/parent")
+        assert parent
+        assert parent.parent_key == "/my_galaxy_instance/my"
+
+    def test_write_secret_queries(self):
+        # a new key needs one lookup for the key itself and one for all of its parents
+        statements = self._select_statements(lambda: self.vault.write_secret("my/parent/secret", "hello parent"))
+        assert len(statements) == 2
+        # parent keys are known now, so only the new key is looked up
+        statements = self._select_statements(lambda: self.vault.write_secret("my/parent/sibling", "hello sibling"))
+        assert len(statements) == 1
+
+    def _select_statements(self, func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        engine = self.app.model.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            func()
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        return statements
+
+    def test_overwrite_secret_after_read(self):
+        self.vault.write_secret("my/cached/secret", "hello cached")
+        assert self.vault.read_secret("my/cached/secret") == "hello cached"
+        self.vault.write_secret("my/cached/secret", "hello overwritten")
+        assert self.vault.read_secret("my/cached/secret") == "hello overwritten"
+
+    def test_read_secret_decrypts_once(self):
+        self.vault.write_secret("my/cached/secret", "hello cached")
+        decrypt = MultiFernet.decrypt
+        with mock.patch.object(MultiFernet, "decrypt", autospec=True, side_effect=decrypt) as mock_decrypt:
+            assert self.vault.read_secret("my/cached/secret") == "hello cached"
+            assert self.vault.read_secret("my/cached/secret") == "hello cached"
+        assert mock_decrypt.call_count == 1
 
     def test_rotate_keys(self):
         config = GalaxyDataTestConfig(vault_config_file=VAULT_CONF_DATABASE)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from galaxy.util import facts
+from galaxy.util.facts import get_facts
+
+
+def test_host_facts_are_strings():
+    host_facts = get_facts()
+    assert isinstance(host_facts["fqdn"], str)
+    assert isinstance(host_facts["hostname"], str)
+    assert "." not in host_facts["hostname"]
+
+
+def test_host_facts_format():
+    host_facts = get_facts()
+    assert "{hostname}".format(**host_facts) == host_facts["hostname"]
+    assert "{fqdn}".format(**host_facts) == host_facts["fqdn"]
+    assert "<function" not in "{hostname}.{fqdn}".format(**host_facts)
+
+
+def test_host_facts_memoized():
+    facts._fqdn.cache_clear()
+    facts._hostname.cache_clear()
+    try:
+        with mock.patch("socket.getfqdn", return_value="galaxy.example.org") as getfqdn, mock.patch(
+            "socket.gethostname", return_value="galaxy.example.org"
+        ) as gethostname:
+            for host_facts in (get_facts(), get_facts()):
+                for _ in range(2):
+                    assert host_facts["fqdn"] == "galaxy.example.org"
+                    assert host_facts["hostname"] == "galaxy"
+        assert getfqdn.call_count == 1
+        assert gethostname.call_count == 1
+    finally:
+        facts._fqdn.cache_clear()
+        facts._hostname.cache_clear()